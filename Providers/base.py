@@ -1,9 +1,110 @@
+import asyncio
+import functools
+import hashlib
 import json
 import logging
+import random
+import re
+import shutil
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
 
-from typing import Any, Union
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import aiofiles
+import orjson
+from pypdf import PdfReader
+
+MAX_PARALLEL_WRITES = 64
+MIN_TEXT_LAYER_CHARS_PER_PAGE = 200
+TEXT_LAYER_SOURCE = "pypdf"
+UPLOAD_EXPIRY_MARGIN = 60
+# Upload results are persisted in the provider cache directory, keyed by PDF content hash
+UPLOAD_CACHE_FILE = "uploads.json"
+RETRYABLE_STATUSES = (429, 503)
+RATE_LIMIT_PATTERN = re.compile(r"rate.?limit|quota", re.IGNORECASE)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Check whether an exception raised by a provider SDK or aiohttp is a transient rate limit error.
+
+    Only HTTP errors, which carry a status code (mistralai SDKError, Reducto APIStatusError,
+    aiohttp ClientResponseError), are considered; their message is checked as a fallback.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "status", None)
+    if not isinstance(status, int):
+        return False
+    return status in RETRYABLE_STATUSES or bool(RATE_LIMIT_PATTERN.search(str(error)))
+
+
+def retry_on_rate_limit(max_retries: int = 3, base: float = 1.0, cap: float = 30.0):
+    """
+    Retry an async function with exponential backoff and jitter when it hits a rate limit.
+
+    Args:
+        max_retries (int): Maximum number of retries after the first failed call.
+        base (float): Delay in seconds before the first retry.
+        cap (float): Maximum delay in seconds between retries.
+    """
+    def decorator(func: Callable):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(max_retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if attempt == max_retries or not is_rate_limit_error(e):
+                        raise
+                    delay = min(cap, base * 2 ** attempt) + random.uniform(0, 0.25)
+                    logging.warning(f"Rate limited in {func.__name__}, retrying in {delay:.1f}s: {str(e)}")
+                    await asyncio.sleep(delay)
+        return wrapper
+    return decorator
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket limiting how many requests are dispatched per time period.
+
+    Attributes:
+        max_rate (float): Number of requests allowed per time period.
+        time_period (float): Length of the time period in seconds.
+        capacity (float): Maximum burst size, at least one token so fractional rates can still dispatch.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        if max_rate <= 0 or time_period <= 0:
+            raise ValueError(f"Rate limit must be positive: {max_rate} per {time_period}s")
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self.capacity = max(1.0, max_rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and consume it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                refill = (now - self._updated_at) * self.max_rate / self.time_period
+                self._tokens = min(self.capacity, self._tokens + refill)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return None
 
 
 @dataclass
@@ -27,14 +128,25 @@ class Provider:
     This class is designed to be extended by specific provider implementations.
     """
 
-    def __init__(self, api_key: str):
+    # How long an upload result stays valid, in seconds
+    upload_ttl = 3600.0
+    # Maximum number of simultaneous API calls per pipeline stage
+    stage_concurrency = {"upload": 4, "url": 8, "ocr": 4}
+
+    def __init__(self, api_key: str, requests_per_second: float = 5.0):
         """
         Initialize the provider with an API key and create a client instance.
 
         Args:
             api_key (str): The API key used to authenticate with the OCR provider.
+            requests_per_second (float): Maximum number of API calls dispatched per second.
         """
         self.api_key = api_key
+        self._limiter = AsyncRateLimiter(max_rate=requests_per_second, time_period=1.0)
+        self._upload_cache_lock = asyncio.Lock()
+        self._pending_uploads: dict[str, asyncio.Task] = {}
+        self._pending_parses: dict[Path, asyncio.Task] = {}
+        self._stage_semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.stage_concurrency.items()}
         self.client = self._create_client()
         self.provider_name = self.__class__.__name__.lower().replace("ocr", "")
 
@@ -42,24 +154,264 @@ class Provider:
         """Create and return client instance."""
         raise NotImplementedError
 
-    async def _create_pdf_url(self, pdf_path: Union[str, Path]):
-        """Upload PDF and return a URL or object for processing."""
+    @retry_on_rate_limit()
+    async def _call_api(self, func: Callable, *args, **kwargs):
+        """Run a blocking provider SDK call in a worker thread, respecting the rate limit and retrying on rate limit errors."""
+        async with self._limiter:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    def _stage(self, name: str) -> asyncio.Semaphore:
+        """Return the semaphore bounding concurrent API calls of a pipeline stage."""
+        return self._stage_semaphores[name]
+
+    async def _create_pdf_url(self, path: Path):
+        """Upload a PDF already validated by parse_pdf and return a URL or object for processing."""
         raise NotImplementedError
 
-    async def parse_pdf(self, pdf_path: Union[str, Path]):
-        """Run OCR parsing on the PDF file."""
+    async def _with_uploaded_pdf(self, path: Path, pdf_hash: Optional[str], cache_dir: Optional[Path],
+                                 process: Callable[[Any], Awaitable]):
+        """
+        Upload a PDF, or reuse a previous upload of the same content, and run an OCR call on the result.
+
+        If the call fails with a cached upload, the provider may have dropped the file before it expired,
+        so the cache entry is evicted and the call is retried once with a fresh upload.
+
+        Args:
+            path (Path): Validated path to the PDF file.
+            pdf_hash (Optional[str]): Content hash of the PDF if already computed, otherwise it is computed here.
+            cache_dir (Optional[Path]): Provider cache directory where uploads are persisted. Uploads are only
+                shared between concurrent calls if None.
+            process (Callable[[Any], Awaitable]): OCR call receiving the URL or object returned by _create_pdf_url.
+
+        Returns:
+            The result of the OCR call.
+        """
+        if pdf_hash is None:
+            pdf_hash = await asyncio.to_thread(self.hash_pdf, path)
+        cache_path = cache_dir / UPLOAD_CACHE_FILE if cache_dir is not None else None
+
+        url, reused = await self._get_pdf_url(path, pdf_hash, cache_path)
+        try:
+            return await process(url)
+        except Exception as e:
+            if not reused or is_rate_limit_error(e):
+                raise
+            logging.warning(f"Cached upload of {path.name} was rejected, uploading again: {str(e)}")
+            await self._evict_upload(pdf_hash, url, cache_path)
+            url, _ = await self._get_pdf_url(path, pdf_hash, cache_path)
+            return await process(url)
+
+    async def _get_pdf_url(self, path: Path, pdf_hash: str, cache_path: Optional[Path]) -> tuple[Any, bool]:
+        """
+        Return the upload result for a PDF, reusing a previous upload of the same content until it expires.
+
+        Concurrent calls for the same content share a single in-flight upload.
+
+        Args:
+            path (Path): Validated path to the PDF file.
+            pdf_hash (str): Content hash of the PDF.
+            cache_path (Optional[Path]): File where upload results are persisted, None to disable persistence.
+
+        Returns:
+            tuple[Any, bool]: The URL or object returned by _create_pdf_url, and whether it came from the cache.
+        """
+        if cache_path is not None:
+            async with self._upload_cache_lock:
+                cache = await asyncio.to_thread(self._load_upload_cache, cache_path)
+            cached = cache.get(pdf_hash)
+            if cached and cached["expires_at"] > time.time() + UPLOAD_EXPIRY_MARGIN:
+                logging.info(f"Reusing uploaded {path.name}")
+                return cached["url"], True
+
+        upload = self._pending_uploads.get(pdf_hash)
+        if upload is None:
+            upload = asyncio.create_task(self._upload_pdf(path, pdf_hash, cache_path))
+            self._pending_uploads[pdf_hash] = upload
+            upload.add_done_callback(lambda _: self._pending_uploads.pop(pdf_hash, None))
+        # Shielded so a cancelled waiter does not cancel the upload shared with others
+        return await asyncio.shield(upload), False
+
+    async def _upload_pdf(self, path: Path, pdf_hash: str, cache_path: Optional[Path]):
+        """Upload a PDF and persist the result in the upload cache."""
+        url = await self._create_pdf_url(path)
+        if cache_path is not None:
+            async with self._upload_cache_lock:
+                # Re-read so entries written by other provider instances are kept
+                cache = await asyncio.to_thread(self._load_upload_cache, cache_path)
+                cache[pdf_hash] = {"url": url, "expires_at": time.time() + self.upload_ttl}
+                await self._save_upload_cache(cache, cache_path)
+        return url
+
+    async def _evict_upload(self, pdf_hash: str, url: Any, cache_path: Optional[Path]):
+        """Remove an upload from the cache unless it has already been replaced by a newer one."""
+        if cache_path is None:
+            return
+        async with self._upload_cache_lock:
+            cache = await asyncio.to_thread(self._load_upload_cache, cache_path)
+            cached = cache.get(pdf_hash)
+            if cached and cached["url"] == url:
+                del cache[pdf_hash]
+                await self._save_upload_cache(cache, cache_path)
+
+    @staticmethod
+    async def _save_upload_cache(cache: dict[str, dict[str, Any]], cache_path: Path):
+        """Persist the upload cache, the caller must hold the upload cache lock."""
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        async with aiofiles.open(cache_path, "w", encoding="utf-8") as f:
+            await f.write(json.dumps(cache, ensure_ascii=False, indent=2))
+
+    @staticmethod
+    def _load_upload_cache(cache_path: Path) -> dict[str, dict[str, Any]]:
+        """Load persisted upload results, dropping the ones that have already expired."""
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in cache.items() if entry.get("expires_at", 0) > now}
+
+    async def parse_pdf(self, pdf_path: Union[str, Path], cache_dir: Optional[Path] = None,
+                        force_refresh: bool = False, prefer_text_layer: bool = False):
+        """
+        Run OCR parsing on the PDF file.
+
+        Args:
+            pdf_path (Union[str, Path]): Path to the PDF file.
+            cache_dir (Optional[Path]): Directory with results cached by PDF content hash. Caching is disabled if None.
+            force_refresh (bool): Ignore a cached result and always call the OCR provider.
+            prefer_text_layer (bool): Use the embedded text layer instead of calling the OCR provider when it is
+                dense enough. The result has no images or formatting and is tagged with the "pypdf" source.
+
+        Returns:
+            RecognizedDocument: The parsed result.
+        """
         try:
             pdf_path = self.validate_pdf_path(pdf_path)
-            return await self._parse_pdf_implementation(pdf_path)
+
+            entry_dir = None
+            pdf_hash = None
+            if cache_dir is not None:
+                pdf_hash = await asyncio.to_thread(self.hash_pdf, pdf_path)
+                entry_dir = cache_dir / pdf_hash
+                if not force_refresh:
+                    cached = await asyncio.to_thread(self._load_cached_result, entry_dir)
+                    if cached is not None:
+                        logging.info(f"Using cached result for {pdf_path.name}")
+                        return cached
+
+            if prefer_text_layer:
+                extracted = await asyncio.to_thread(self._extract_text_layer, pdf_path)
+                if extracted is not None:
+                    logging.info(f"Using embedded text layer of {pdf_path.name}, OCR skipped")
+                    return extracted
+
+            if entry_dir is None:
+                return await self._parse_pdf_implementation(pdf_path, pdf_hash, cache_dir)
+
+            # Duplicate PDFs processed at the same time share a single OCR call and cache write
+            parse = self._pending_parses.get(entry_dir)
+            if parse is None:
+                parse = asyncio.create_task(self._parse_and_cache(pdf_path, pdf_hash, cache_dir))
+                self._pending_parses[entry_dir] = parse
+                parse.add_done_callback(lambda _: self._pending_parses.pop(entry_dir, None))
+            return await asyncio.shield(parse)
         except Exception as e:
             raise e
 
-    async def _parse_pdf_implementation(self, pdf_path: Path):
+    async def _parse_and_cache(self, pdf_path: Path, pdf_hash: str, cache_dir: Path):
+        """
+        Run OCR parsing and replace the cache entry of the PDF with the result.
+
+        The result is written to a temporary directory first, so a refreshed entry never keeps
+        files from the previous result.
+
+        Args:
+            pdf_path (Path): Validated path to the PDF file.
+            pdf_hash (str): Content hash of the PDF.
+            cache_dir (Path): Provider cache directory.
+
+        Returns:
+            RecognizedDocument: The parsed result.
+        """
+        result = await self._parse_pdf_implementation(pdf_path, pdf_hash, cache_dir)
+        if result:
+            entry_dir = cache_dir / pdf_hash
+            tmp_dir = entry_dir.with_name(f"{entry_dir.name}.tmp")
+            await asyncio.to_thread(shutil.rmtree, tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir(parents=True)
+            await self._save_pdf_data(result, tmp_dir)
+            await asyncio.to_thread(shutil.rmtree, entry_dir, ignore_errors=True)
+            tmp_dir.rename(entry_dir)
+        return result
+
+    @staticmethod
+    def _extract_text_layer(pdf_path: Path) -> Optional[RecognizedDocument]:
+        """
+        Extract the embedded text layer of a PDF without calling the OCR provider.
+
+        Args:
+            pdf_path (Path): Validated path to the PDF file.
+
+        Returns:
+            Optional[RecognizedDocument]: The extracted text, or None if the text layer is too sparse to skip OCR.
+        """
+        try:
+            pages = PdfReader(pdf_path).pages
+            text = "\n".join(page.extract_text() or "" for page in pages)
+        except Exception as e:
+            # The text layer is only an optimisation, any pypdf failure falls back to OCR
+            logging.info(f"Could not read text layer of {pdf_path.name}: {str(e)}")
+            return None
+
+        if not pages or len(text) / len(pages) <= MIN_TEXT_LAYER_CHARS_PER_PAGE:
+            return None
+        return RecognizedDocument(text=text, metadata={"source": TEXT_LAYER_SOURCE})
+
+    @staticmethod
+    def hash_pdf(pdf_path: Path) -> str:
+        """Return a fingerprint of the PDF file content used as the cache key, reading the file in chunks."""
+        with open(pdf_path, "rb") as f:
+            return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+    @staticmethod
+    def _load_cached_result(entry_dir: Path) -> Optional[RecognizedDocument]:
+        """
+        Rebuild a RecognizedDocument previously saved by _save_pdf_data.
+
+        Args:
+            entry_dir (Path): Cache directory of a single document.
+
+        Returns:
+            Optional[RecognizedDocument]: The cached result, or None if the cache entry is incomplete.
+        """
+        text_path = entry_dir / "document.txt"
+        metadata_path = entry_dir / "metadata.json"
+        if not text_path.is_file() or not metadata_path.is_file():
+            return None
+
+        metadata = orjson.loads(metadata_path.read_bytes())
+
+        images = {
+            path.name: path.read_bytes()
+            for path in entry_dir.iterdir()
+            if path.name not in ("document.txt", "metadata.json")
+        }
+        return RecognizedDocument(
+            text=text_path.read_text(encoding="utf-8"),
+            image_bytes_by_name=images,
+            metadata=metadata,
+        )
+
+    async def _parse_pdf_implementation(self, pdf_path: Path, pdf_hash: Optional[str] = None,
+                                        cache_dir: Optional[Path] = None):
         """
         Actual implementation of PDF parsing to be overridden by the subclass.
 
         Args:
             pdf_path (Path): Validated path to the PDF file.
+            pdf_hash (Optional[str]): Content hash of the PDF if parse_pdf already computed it.
+            cache_dir (Optional[Path]): Provider cache directory, passed on to _with_uploaded_pdf.
 
         Returns:
             RecognizedDocument: The parsed result.
@@ -76,8 +428,21 @@ class Provider:
             raise ValueError(f"Path is not a file: {path}")
         return path
 
-    async def process_folder(self, folder_path: Union[str, Path], output_dir: Union[str, Path]):
-        """Process all PDF files in a folder and save results."""
+    async def process_folder(self, folder_path: Union[str, Path], output_dir: Union[str, Path], concurrency: int = 8,
+                             force_refresh: bool = False, prefer_text_layer: bool = False):
+        """
+        Process all PDF files in a folder concurrently and save results.
+
+        Args:
+            folder_path (Union[str, Path]): Folder containing the PDF files.
+            output_dir (Union[str, Path]): Directory where the results will be saved.
+            concurrency (int): Maximum number of PDFs processed at the same time.
+            force_refresh (bool): Ignore results cached from previous runs.
+            prefer_text_layer (bool): Skip the OCR provider for PDFs with a dense embedded text layer.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1: {concurrency}")
+
         folder_path = Path(folder_path)
         output_dir = Path(output_dir)
 
@@ -94,29 +459,39 @@ class Provider:
 
         logging.info(f"Found {len(pdf_files)} PDF files in {folder_path}")
 
-        for pdf_file in pdf_files:
-            try:
-                logging.info(f"Processing {pdf_file.name} with {self.__class__.__name__}...")
-                result = await self.parse_pdf(pdf_file)
-                if result:
-                    await self.save_results(result, pdf_file.stem, output_dir)
-                    logging.info(f"Successfully processed {pdf_file.name}")
-                else:
-                    logging.info(f"Failed to process {pdf_file.name}")
-            except Exception as e:
-                logging.info(f"Error processing {pdf_file.name}: {str(e)}")
-                raise e
+        # Results are cached by PDF content so re-runs and duplicate files skip the OCR call
+        cache_dir = output_dir / ".cache" / self.provider_name
+
+        # Limit the number of PDFs in flight; each pipeline stage is further bounded by its own semaphore,
+        # so one PDF can be uploading while another is being recognized
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def process_one(pdf_file: Path):
+            async with semaphore:
+                try:
+                    logging.info(f"Processing {pdf_file.name} with {self.__class__.__name__}...")
+                    result = await self.parse_pdf(pdf_file, cache_dir=cache_dir, force_refresh=force_refresh,
+                                                  prefer_text_layer=prefer_text_layer)
+                    if result:
+                        await self.save_results(result, pdf_file.stem, output_dir)
+                        logging.info(f"Successfully processed {pdf_file.name}")
+                    else:
+                        logging.info(f"Failed to process {pdf_file.name}")
+                except Exception as e:
+                    logging.error(f"Error processing {pdf_file.name}: {str(e)}")
+
+        async with asyncio.TaskGroup() as tg:
+            for pdf_file in pdf_files:
+                tg.create_task(process_one(pdf_file))
 
     async def save_results(self, result: RecognizedDocument, pdf_name: str, output_dir: Path):
         """Save OCR results to the output directory."""
 
-        # Create provider-specific subdirectory
-        provider_dir = output_dir / self.provider_name
-        provider_dir.mkdir(exist_ok=True)
-
-        # Create document-specific subdirectory
-        doc_dir = (provider_dir / pdf_name)
-        doc_dir.mkdir(exist_ok=True)
+        # Create document-specific subdirectory inside the provider-specific one,
+        # text extracted without OCR is kept apart from the provider results
+        source = TEXT_LAYER_SOURCE if result.metadata.get("source") == TEXT_LAYER_SOURCE else self.provider_name
+        doc_dir = output_dir / source / pdf_name
+        doc_dir.mkdir(parents=True, exist_ok=True)
 
         await self._save_pdf_data(result, doc_dir)
 
@@ -129,12 +504,18 @@ class Provider:
             result (RecognizedDocument): The parsed document result.
             doc_dir (Path): Directory where the result will be saved.
         """
-        with open(doc_dir / "document.txt", "w", encoding="utf-8") as f:
-            f.write(result.text)
+        async with aiofiles.open(doc_dir / "document.txt", "w", encoding="utf-8") as f:
+            await f.write(result.text)
+
+        # Images are independent files, so their writes are kept in flight together
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_WRITES)
+
+        async def write_image(name: str, img_bytes: bytes):
+            async with semaphore:
+                async with aiofiles.open(doc_dir / name, "wb") as f:
+                    await f.write(img_bytes)
 
-        for name, img_bytes in result.image_bytes_by_name.items():
-            with open(doc_dir / name, "wb") as f:
-                f.write(img_bytes)
+        await asyncio.gather(*(write_image(name, img_bytes) for name, img_bytes in result.image_bytes_by_name.items()))
 
-        with open(doc_dir / "metadata.json", "w", encoding="utf-8") as f:
-            json.dump(result.metadata, f, ensure_ascii=False, indent=2)
+        async with aiofiles.open(doc_dir / "metadata.json", "wb") as f:
+            await f.write(orjson.dumps(result.metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
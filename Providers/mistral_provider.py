@@ -1,10 +1,45 @@
-import base64
+import asyncio
+import binascii
 import logging
 from pathlib import Path
-from typing import Union
+from typing import Optional
 from mistralai import Mistral
 from Providers.base import Provider, RecognizedDocument
 
+JPEG_DATA_URL_PREFIX = "data:image/jpeg;base64,"
+JPEG_DATA_URL_PREFIX_LEN = len(JPEG_DATA_URL_PREFIX)
+
+
+def _postprocess_ocr_response(ocr_response: dict) -> tuple[str, dict[str, bytes]]:
+    """
+    Combine page markdown and decode base64 images from a Mistral OCR response.
+
+    Args:
+        ocr_response (dict): The OCR response dumped to a plain dictionary.
+
+    Returns:
+        tuple[str, dict[str, bytes]]: The combined text and images keyed by filename.
+    """
+    parts: list[str] = []
+    images: dict[str, bytes] = {}
+    # Bind hot-loop lookups to locals once
+    append_text = parts.append
+    b64decode = binascii.a2b_base64
+    prefix, prefix_len = JPEG_DATA_URL_PREFIX, JPEG_DATA_URL_PREFIX_LEN
+
+    for page in ocr_response['pages']:
+        append_text(page['markdown'] or '')
+        page_num = page['index'] + 1
+        for i, img in enumerate(page['images'], 1):
+            base64_data = img['image_base64']
+            if base64_data and base64_data[:prefix_len] == prefix:
+                base64_data = base64_data[prefix_len:]
+            # Images returned without content are skipped rather than saved as empty files
+            if not base64_data:
+                continue
+            images[f"page_{page_num}_im_{i}.jpeg"] = b64decode(base64_data)
+    return "".join(parts), images
+
 
 class MistralOCR(Provider):
     """
@@ -13,52 +48,53 @@ class MistralOCR(Provider):
     4.5sec - 13 text pages with 4 (parsed) images
     """
 
+    # Signed URLs are valid for 24 hours by default
+    upload_ttl = 24 * 3600.0
+
     def _create_client(self):
         return Mistral(api_key=self.api_key)
 
-    async def _create_pdf_url(self, pdf_path: Union[str, Path]):
-        path = self.validate_pdf_path(pdf_path)
-        with open(path, "rb") as file:
-            file_content = file.read()
+    async def _create_pdf_url(self, path: Path):
+        def upload(file):
+            # Rewind so a retried upload sends the whole file again
+            file.seek(0)
+            return self.client.files.upload(
+                file={
+                    "file_name": str(path),
+                    "content": file,
+                },
+                purpose="ocr"
+            )
 
-        uploaded_pdf = self.client.files.upload(
-            file={
-                "file_name": str(path),
-                "content": file_content,
-            },
-            purpose="ocr"
-        )
+        # The SDK streams the open file, so the PDF is never held in memory as a whole
+        with open(path, "rb") as file:
+            async with self._stage("upload"):
+                uploaded_pdf = await self._call_api(upload, file)
 
-        document_url = self.client.files.get_signed_url(file_id=uploaded_pdf.id)
+        async with self._stage("url"):
+            document_url = await self._call_api(self.client.files.get_signed_url, file_id=uploaded_pdf.id)
         logging.info('PDF URL CREATED')
         return document_url.url
 
-    async def _parse_pdf_implementation(self, pdf_path: Union[str, Path]) -> RecognizedDocument:
-        document_url = await self._create_pdf_url(pdf_path)
-
-        ocr_response = self.client.ocr.process(
-            model="mistral-ocr-latest",
-            document={
-                "type": "document_url",
-                "document_url": document_url,
-            },
-            include_image_base64=True
-        ).model_dump()
-        text = ""
-        images: dict[str, bytes] = {}
-
-        for page in ocr_response['pages']:
-            page_num = page['index']
-            text += page.get('markdown')
+    async def _parse_pdf_implementation(self, pdf_path: Path, pdf_hash: Optional[str] = None,
+                                        cache_dir: Optional[Path] = None) -> RecognizedDocument:
+        async def recognize(document_url: str) -> dict:
+            async with self._stage("ocr"):
+                return (await self._call_api(
+                    self.client.ocr.process,
+                    model="mistral-ocr-latest",
+                    document={
+                        "type": "document_url",
+                        "document_url": document_url,
+                    },
+                    # Mistral OCR has no image URL option: image content is only returned inline as base64
+                    include_image_base64=True
+                )).model_dump()
 
-            for i, img in enumerate(page.get('images')):
-                base64_data = img.get('image_base64', '')
-                if base64_data.startswith("data:image/jpeg;base64,"):
-                    base64_data = base64_data.split(",", 1)[1]
-                image_bytes = base64.b64decode(base64_data)
-                image_name = f"page_{page_num + 1}_im_{i + 1}.jpeg"
-                images[image_name] = image_bytes
-        print(text)
+        ocr_response = await self._with_uploaded_pdf(pdf_path, pdf_hash, cache_dir, recognize)
+        # Decoding runs in a worker thread to keep the event loop free for other PDFs
+        text, images = await asyncio.to_thread(_postprocess_ocr_response, ocr_response)
+        logging.debug("Extracted %d chars from %s", len(text), pdf_path)
         return RecognizedDocument(
             text=text,
             image_bytes_by_name=images,
@@ -1,10 +1,14 @@
+import asyncio
+import logging
 from pathlib import Path
-from typing import Union
+from typing import Optional
 
 import aiohttp
 from reducto import Reducto
 
-from Providers.base import Provider, RecognizedDocument
+from Providers.base import RETRYABLE_STATUSES, Provider, RecognizedDocument, retry_on_rate_limit
+
+MAX_PARALLEL_DOWNLOADS = 16
 
 
 class ReductoOCR(Provider):
@@ -17,34 +21,66 @@ class ReductoOCR(Provider):
     def _create_client(self):
         return Reducto(api_key=self.api_key)
 
-    async def _create_pdf_url(self, pdf_path: Union[str, Path]):
-        path = self.validate_pdf_path(pdf_path)
-        document_url = self.client.upload(file=path)
+    async def _create_pdf_url(self, path: Path):
+        async with self._stage("upload"):
+            document_url = await self._call_api(self.client.upload, file=path)
         return document_url.model_dump()
 
-    async def _parse_pdf_implementation(self, pdf_path: Union[str, Path]) -> RecognizedDocument:
-        document_url = await self._create_pdf_url(pdf_path)
+    @staticmethod
+    @retry_on_rate_limit()
+    async def _download_image(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, image_url: str):
+        """Download a single image using a shared session, raising on rate limit responses so they are retried."""
+        async with semaphore:
+            async with session.get(image_url) as response:
+                if response.status in RETRYABLE_STATUSES:
+                    response.raise_for_status()
+                if response.status == 200:
+                    return await response.read()
+                return None
+
+    @staticmethod
+    async def _fetch_image(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, image_url: str):
+        """Download a single image, returning its content or None on failure so one image cannot fail the document."""
+        try:
+            return await ReductoOCR._download_image(session, semaphore, image_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Skipping image {image_url}: {str(e)}")
+            return None
+
+    async def _parse_pdf_implementation(self, pdf_path: Path, pdf_hash: Optional[str] = None,
+                                        cache_dir: Optional[Path] = None) -> RecognizedDocument:
+        async def recognize(document_url: dict) -> dict:
+            async with self._stage("ocr"):
+                return (await self._call_api(
+                    self.client.parse.run,
+                    document_url=document_url,
+                    options={'chunking': {'chunk_mode': 'page'}},
+                    experimental_options={'return_figure_images': True})).model_dump()
 
-        result = self.client.parse.run(
-            document_url=document_url,
-            options={'chunking': {'chunk_mode': 'page'}},
-            experimental_options={'return_figure_images': True}).model_dump()
+        result = await self._with_uploaded_pdf(pdf_path, pdf_hash, cache_dir, recognize)
         result = result['result']
         pages = result['chunks']
-        text = ""
-        images: dict[str, bytes] = {}
+        parts: list[str] = []
+        pending_images: list[tuple[str, str]] = []
         for page_num, page in enumerate(pages, 1):
-            text += page['content']
+            parts.append(page['content'] or '')
             for block_num, block in enumerate(page['blocks']):
                 image_url = block.get('image_url')
                 if image_url:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(image_url) as response:
-                            if response.status == 200:
-                                image_data = await response.read()
-                                image_name = f"page_{page_num}_im_{block_num + 1}.jpeg"
-                                images[image_name] = image_data
-        print(text)
+                    pending_images.append((f"page_{page_num}_im_{block_num + 1}.jpeg", image_url))
+
+        images: dict[str, bytes] = {}
+        if pending_images:
+            semaphore = asyncio.Semaphore(MAX_PARALLEL_DOWNLOADS)
+            async with aiohttp.ClientSession() as session:
+                downloads = await asyncio.gather(
+                    *(self._fetch_image(session, semaphore, image_url) for _, image_url in pending_images)
+                )
+            for (image_name, _), image_data in zip(pending_images, downloads):
+                if image_data is not None:
+                    images[image_name] = image_data
+        text = "".join(parts)
+        logging.debug("Extracted %d chars from %s", len(text), pdf_path)
         return RecognizedDocument(
             text=text,
             image_bytes_by_name=images,